@@ -0,0 +1,107 @@
+"""
+Admission control for expensive work (analyses and LLM calls).
+
+Each controller allows a fixed number of in-flight tasks and a bounded wait
+queue. Requests that find the queue full, or wait longer than the queue
+deadline, are rejected immediately instead of piling up, so throughput stays
+flat under overload.
+"""
+import os
+import math
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Dict, Any
+
+
+class AdmissionRejected(Exception):
+    """Raised when a controller sheds a request."""
+
+    def __init__(self, name: str, retry_after: int):
+        super().__init__(f"{name} is at capacity, retry in {retry_after}s")
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """Bounded concurrency with a bounded, deadline-limited wait queue."""
+
+    def __init__(self, name: str, max_inflight: int, max_queue: int, queue_timeout: float):
+        self.name = name
+        self.max_inflight = max(1, max_inflight)
+        self.max_queue = max(0, max_queue)
+        self.queue_timeout = queue_timeout
+        self._semaphore = asyncio.Semaphore(self.max_inflight)
+
+        self.in_flight = 0
+        self.queued = 0
+        self.admitted = 0
+        self.shed_queue_full = 0
+        self.shed_timeout = 0
+
+    @property
+    def saturated(self) -> bool:
+        """True if a new request would be shed right now."""
+        return self._semaphore.locked() and self.queued >= self.max_queue
+
+    @property
+    def retry_after(self) -> int:
+        return max(1, math.ceil(self.queue_timeout))
+
+    @asynccontextmanager
+    async def slot(self):
+        """
+        Hold one in-flight slot for the duration of the block.
+        Raises AdmissionRejected if the queue is full or the deadline passes.
+        """
+        if self._semaphore.locked():
+            if self.queued >= self.max_queue:
+                self.shed_queue_full += 1
+                raise AdmissionRejected(self.name, self.retry_after)
+
+            self.queued += 1
+            try:
+                await asyncio.wait_for(self._semaphore.acquire(), timeout=self.queue_timeout)
+            except asyncio.TimeoutError:
+                self.shed_timeout += 1
+                raise AdmissionRejected(self.name, self.retry_after)
+            finally:
+                self.queued -= 1
+        else:
+            # A slot is free: acquiring it does not suspend
+            await self._semaphore.acquire()
+
+        self.in_flight += 1
+        self.admitted += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            self._semaphore.release()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "in_flight": self.in_flight,
+            "queue_depth": self.queued,
+            "max_inflight": self.max_inflight,
+            "max_queue": self.max_queue,
+            "admitted": self.admitted,
+            "shed_queue_full": self.shed_queue_full,
+            "shed_timeout": self.shed_timeout,
+            "saturated": self.saturated,
+        }
+
+
+# Analyses as a whole (SEC downloads, parsing, LLM)
+analysis_admission = AdmissionController(
+    "analysis",
+    max_inflight=int(os.getenv("MAX_INFLIGHT_ANALYSES", "4")),
+    max_queue=int(os.getenv("ANALYSIS_QUEUE_SIZE", "16")),
+    queue_timeout=float(os.getenv("ANALYSIS_QUEUE_TIMEOUT_SECONDS", "10")),
+)
+
+# LLM calls; when saturated, analyses are returned without a fresh summary
+llm_admission = AdmissionController(
+    "llm",
+    max_inflight=int(os.getenv("MAX_INFLIGHT_LLM_CALLS", "4")),
+    max_queue=int(os.getenv("LLM_QUEUE_SIZE", "8")),
+    queue_timeout=float(os.getenv("LLM_QUEUE_TIMEOUT_SECONDS", "5")),
+)
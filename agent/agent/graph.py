@@ -9,6 +9,7 @@ This agent orchestrates the analysis workflow:
 5. Generate investment summary (uses LLM - minimal tokens)
 """
 import os
+import asyncio
 from typing import TypedDict, Optional, List, Annotated
 from datetime import date
 
@@ -16,10 +17,28 @@ from langgraph.graph import StateGraph, END
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_core.messages import HumanMessage
 
-from .models import QuarterlyMetrics, TrendAnalysis, AnalysisResponse
+from .models import QuarterlyMetrics, TrendAnalysis, AnalysisResponse, BatchSummaries
 from .tools.xbrl_extractor import extract_quarterly_metrics, calculate_trends
 from .tools.price_fetcher import get_current_price
-from .prompts import SYNTHESIS_PROMPT, format_metrics_for_prompt
+from .tools.metrics_snapshot import get_snapshot
+from .admission import analysis_admission, llm_admission, AdmissionRejected
+from .prompts import (
+    SYNTHESIS_PROMPT,
+    BATCH_SYNTHESIS_PROMPT,
+    BATCH_COMPANY_BLOCK,
+    format_metrics_for_prompt,
+)
+
+
+# Tickers summarized per LLM call in batch analyses
+LLM_BATCH_SIZE = int(os.getenv("LLM_BATCH_SIZE", "5"))
+
+# Tickers (or LLM calls) of one batch analysis that run at the same time
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "4"))
+
+# Summary placeholders (LLM failed or queue saturated) share this prefix
+LLM_PLACEHOLDER_PREFIX = "(LLM summary"
+LLM_BUSY_SUMMARY = f"{LLM_PLACEHOLDER_PREFIX} skipped: AI service is busy, please retry later)"
 
 
 # Agent State
@@ -44,10 +63,16 @@ class AgentState(TypedDict):
 async def fetch_xbrl_data(state: AgentState) -> AgentState:
     """Fetch and parse XBRL data from SEC. No LLM used."""
     try:
-        company_name, cik, metrics = await extract_quarterly_metrics(
-            state["ticker"],
-            state["num_quarters"]
-        )
+        # Serve from the precomputed snapshot when it covers the request
+        snapshot = get_snapshot()
+        cached = snapshot.lookup(state["ticker"], state["num_quarters"]) if snapshot else None
+        if cached:
+            company_name, cik, metrics = cached
+        else:
+            company_name, cik, metrics = await extract_quarterly_metrics(
+                state["ticker"],
+                state["num_quarters"]
+            )
         return {
             **state,
             "company_name": company_name,
@@ -78,6 +103,8 @@ async def fetch_current_price(state: AgentState) -> AgentState:
     if state.get("error"):
         return state
     
+    # Off when the caller already fetched the price (e.g. to compute an ETag),
+    # even if that fetch found none: the result must match what was fetched
     if state.get("include_current_price", True):
         price = await get_current_price(state["ticker"])
         return {
@@ -87,64 +114,127 @@ async def fetch_current_price(state: AgentState) -> AgentState:
     return state
 
 
+def _create_llm() -> ChatGoogleGenerativeAI:
+    """Create the Gemini chat model configured by LLM_MODEL."""
+    model_name = os.getenv("LLM_MODEL", "gemini-2.0-flash")
+    return ChatGoogleGenerativeAI(
+        model=model_name,
+        temperature=0.3,
+    )
+
+
+def _prompt_fields(state: AgentState) -> dict:
+    """Template fields shared by the single and batched synthesis prompts."""
+    metrics = state.get("quarterly_metrics", [])
+    trends = state.get("trend_analysis") or TrendAnalysis()
+    return {
+        "ticker": state["ticker"],
+        "company_name": state.get("company_name", "Unknown"),
+        "metrics_summary": format_metrics_for_prompt(metrics),
+        "current_price": state.get("current_price") or "N/A",
+        "revenue_trend": trends.revenue_trend or "N/A",
+        "avg_growth": f"{trends.avg_revenue_growth_yoy*100:.1f}%" if trends.avg_revenue_growth_yoy else "N/A",
+        "margin_trend": trends.margin_trend or "N/A",
+        "eps_trend": trends.eps_trend or "N/A",
+    }
+
+
+def _response_text(content) -> str:
+    """Extract text from an LLM response - handles both string and list content."""
+    if isinstance(content, list):
+        # Gemini returns list of content blocks, extract text from each
+        text_parts = []
+        for part in content:
+            if isinstance(part, dict) and "text" in part:
+                text_parts.append(part["text"])
+            elif isinstance(part, str):
+                text_parts.append(part)
+        return " ".join(text_parts)
+    return str(content)
+
+
 async def generate_summary(state: AgentState) -> AgentState:
     """Generate investment summary using LLM. This is the only step that uses tokens."""
     if state.get("error"):
         return state
     
-    # Get LLM model from environment
-    model_name = os.getenv("LLM_MODEL", "gemini-2.0-flash")
-    
     try:
-        llm = ChatGoogleGenerativeAI(
-            model=model_name,
-            temperature=0.3,
-        )
+        llm = _create_llm()
+        prompt = SYNTHESIS_PROMPT.format(**_prompt_fields(state))
         
-        # Format the prompt
-        metrics = state.get("quarterly_metrics", [])
-        trends = state.get("trend_analysis") or TrendAnalysis()
-        
-        prompt = SYNTHESIS_PROMPT.format(
-            ticker=state["ticker"],
-            company_name=state.get("company_name", "Unknown"),
-            metrics_summary=format_metrics_for_prompt(metrics),
-            current_price=state.get("current_price") or "N/A",
-            revenue_trend=trends.revenue_trend or "N/A",
-            avg_growth=f"{trends.avg_revenue_growth_yoy*100:.1f}%" if trends.avg_revenue_growth_yoy else "N/A",
-            margin_trend=trends.margin_trend or "N/A",
-            eps_trend=trends.eps_trend or "N/A",
-        )
-        
-        # Call LLM
-        response = await llm.ainvoke([HumanMessage(content=prompt)])
-        
-        # Extract text from response - handle both string and list content
-        content = response.content
-        if isinstance(content, list):
-            # Gemini returns list of content blocks, extract text from first one
-            text_parts = []
-            for part in content:
-                if isinstance(part, dict) and "text" in part:
-                    text_parts.append(part["text"])
-                elif isinstance(part, str):
-                    text_parts.append(part)
-            summary = " ".join(text_parts)
-        else:
-            summary = str(content)
+        # Call LLM (shed when the LLM queue is saturated)
+        async with llm_admission.slot():
+            response = await llm.ainvoke([HumanMessage(content=prompt)])
         
         return {
             **state,
-            "investment_summary": summary,
+            "investment_summary": _response_text(response.content),
+        }
+    except AdmissionRejected:
+        # Degrade gracefully: return the metrics without a fresh summary
+        return {
+            **state,
+            "investment_summary": LLM_BUSY_SUMMARY,
         }
     except Exception as e:
         # If LLM fails, still return the data without summary
         return {
             **state,
-            "investment_summary": f"(LLM summary unavailable: {str(e)})",
+            "investment_summary": f"{LLM_PLACEHOLDER_PREFIX} unavailable: {str(e)})",
         }
 
 
+async def generate_summaries_batch(
+    states: List[AgentState],
+    batch_size: Optional[int] = None
+) -> List[AgentState]:
+    """
+    Generate investment summaries for several tickers, batch_size per LLM call.
+    Each call sends the instructions once and asks for structured output with
+    one summary per ticker. Tickers missing from a batch's output (or whole
+    batches whose structured parsing fails) fall back to per-ticker calls.
+    """
+    batch_size = max(1, batch_size or LLM_BATCH_SIZE)
+    pending = [s for s in states if not s.get("error")]
+    batches = [pending[i:i + batch_size] for i in range(0, len(pending), batch_size)]
+    summaries = {}
+    shed = set()
+    limit = asyncio.Semaphore(max(1, BATCH_CONCURRENCY))
+    
+    async def summarize_batch(batch: List[AgentState]):
+        companies = "\n\n".join(
+            BATCH_COMPANY_BLOCK.format(**_prompt_fields(s)) for s in batch
+        )
+        prompt = BATCH_SYNTHESIS_PROMPT.format(companies=companies)
+        try:
+            llm = _create_llm().with_structured_output(BatchSummaries)
+            async with limit, llm_admission.slot():
+                result = await llm.ainvoke([HumanMessage(content=prompt)])
+            for item in result.summaries:
+                summaries[item.ticker.strip().upper()] = item.summary
+        except AdmissionRejected:
+            # No per-ticker fallback: that would only add load
+            shed.update(s["ticker"] for s in batch)
+        except Exception as e:
+            print(f"Batched summary failed, falling back to per-ticker calls: {e}")
+    
+    # A batch of one gains nothing over the regular prompt
+    await asyncio.gather(*(summarize_batch(b) for b in batches if len(b) > 1))
+    
+    async def finish(state: AgentState) -> AgentState:
+        if state.get("error"):
+            return state
+        summary = summaries.get(state["ticker"])
+        if summary:
+            return {**state, "investment_summary": summary}
+        if state["ticker"] in shed:
+            return {**state, "investment_summary": LLM_BUSY_SUMMARY}
+        async with limit:
+            return await generate_summary(state)
+    
+    return list(await asyncio.gather(*(finish(s) for s in states)))
+
+
 def should_continue(state: AgentState) -> str:
     """Decide whether to continue or end (if error occurred)."""
     if state.get("error"):
@@ -153,15 +243,20 @@ def should_continue(state: AgentState) -> str:
 
 
 # Build the graph
-def create_analysis_graph():
-    """Create the LangGraph workflow for investment analysis."""
+def create_analysis_graph(include_summary: bool = True):
+    """
+    Create the LangGraph workflow for investment analysis.
+    With include_summary=False the graph stops after fetching the price, so
+    summaries can be generated separately (e.g. batched across tickers).
+    """
     workflow = StateGraph(AgentState)
     
     # Add nodes
     workflow.add_node("fetch_xbrl", fetch_xbrl_data)
     workflow.add_node("analyze_trends", analyze_trends)
     workflow.add_node("fetch_price", fetch_current_price)
-    workflow.add_node("generate_summary", generate_summary)
+    if include_summary:
+        workflow.add_node("generate_summary", generate_summary)
     
     # Define edges
     workflow.set_entry_point("fetch_xbrl")
@@ -176,32 +271,22 @@ def create_analysis_graph():
     )
     
     workflow.add_edge("analyze_trends", "fetch_price")
-    workflow.add_edge("fetch_price", "generate_summary")
-    workflow.add_edge("generate_summary", END)
+    if include_summary:
+        workflow.add_edge("fetch_price", "generate_summary")
+        workflow.add_edge("generate_summary", END)
+    else:
+        workflow.add_edge("fetch_price", END)
     
     return workflow.compile()
 
 
-# Main analysis function
-async def analyze_stock(
+def _initial_state(
     ticker: str,
-    num_quarters: int = 3,
-    include_current_price: bool = True
-) -> AnalysisResponse:
-    """
-    Run the complete investment analysis for a stock.
-    
-    Args:
-        ticker: Stock ticker symbol (e.g., "AAPL")
-        num_quarters: Number of 10-Q quarters to analyze
-        include_current_price: Whether to fetch current price from Giraffe API
-    
-    Returns:
-        AnalysisResponse with all extracted data and AI summary
-    """
-    graph = create_analysis_graph()
-    
-    initial_state: AgentState = {
+    num_quarters: int,
+    include_current_price: bool,
+    current_price: Optional[float] = None
+) -> AgentState:
+    return {
         "ticker": ticker.upper(),
         "num_quarters": num_quarters,
         "include_current_price": include_current_price,
@@ -209,15 +294,14 @@ async def analyze_stock(
         "cik": None,
         "quarterly_metrics": [],
         "trend_analysis": None,
-        "current_price": None,
+        "current_price": current_price,
         "investment_summary": None,
         "error": None,
     }
-    
-    # Run the graph
-    result = await graph.ainvoke(initial_state)
-    
-    # Convert to response model
+
+
+def _to_response(result: AgentState) -> AnalysisResponse:
+    """Convert a final graph state to the response model."""
     return AnalysisResponse(
         ticker=result["ticker"],
         company_name=result.get("company_name"),
@@ -229,3 +313,86 @@ async def analyze_stock(
         investment_summary=result.get("investment_summary"),
         error=result.get("error"),
     )
+
+
+# Main analysis function
+async def analyze_stock(
+    ticker: str,
+    num_quarters: int = 3,
+    include_current_price: bool = True,
+    current_price: Optional[float] = None
+) -> AnalysisResponse:
+    """
+    Run the complete investment analysis for a stock.
+    
+    Args:
+        ticker: Stock ticker symbol (e.g., "AAPL")
+        num_quarters: Number of 10-Q quarters to analyze
+        include_current_price: Whether to fetch current price from Giraffe API
+        current_price: Price already fetched by the caller; pass it with
+            include_current_price=False so it isn't fetched again
+    
+    Returns:
+        AnalysisResponse with all extracted data and AI summary
+    """
+    graph = create_analysis_graph()
+    
+    # Run the graph
+    result = await graph.ainvoke(
+        _initial_state(ticker, num_quarters, include_current_price, current_price)
+    )
+    
+    return _to_response(result)
+
+
+async def analyze_stocks(
+    tickers: List[str],
+    num_quarters: int = 3,
+    include_current_price: bool = True,
+    batch_size: Optional[int] = None
+) -> List[AnalysisResponse]:
+    """
+    Run the analysis for several stocks, batching the LLM summaries.
+    
+    Each ticker's data steps hold their own analysis admission slot, so a
+    batch is charged like the same number of single analyses. Tickers that
+    are shed get an error in their response; if every ticker is shed,
+    AdmissionRejected is raised.
+    
+    Args:
+        tickers: Stock ticker symbols
+        num_quarters: Number of 10-Q quarters to analyze
+        include_current_price: Whether to fetch current prices from Giraffe API
+        batch_size: Tickers per LLM call (defaults to LLM_BATCH_SIZE)
+    
+    Returns:
+        One AnalysisResponse per ticker, in the order given
+    """
+    graph = create_analysis_graph(include_summary=False)
+    limit = asyncio.Semaphore(max(1, BATCH_CONCURRENCY))
+    
+    rejected: List[AdmissionRejected] = []
+    
+    # Data steps use no LLM, so run them concurrently (up to BATCH_CONCURRENCY)
+    async def run(ticker: str) -> AgentState:
+        state = _initial_state(ticker, num_quarters, include_current_price)
+        async with limit:
+            try:
+                async with analysis_admission.slot():
+                    return await graph.ainvoke(state)
+            except AdmissionRejected as e:
+                rejected.append(e)
+                return {**state, "error": "Server is busy, please retry later"}
+    
+    states = await asyncio.gather(*(run(t) for t in tickers))
+    if len(rejected) == len(states):
+        raise rejected[0]
+    results = await generate_summaries_batch(list(states), batch_size)
+    
+    return [_to_response(r) for r in results]
+
+
+def has_fresh_summary(result: AnalysisResponse) -> bool:
+    """True if the analysis carries a real LLM summary, not a placeholder."""
+    summary = result.investment_summary
+    return bool(summary) and not summary.startswith(LLM_PLACEHOLDER_PREFIX)
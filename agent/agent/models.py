@@ -1,8 +1,12 @@
 """
 Pydantic models for the AI Investment Analysis Agent.
 """
-from typing import Optional, List
-from pydantic import BaseModel
+from typing import Optional, List, Dict
+from pydantic import BaseModel, Field
+
+
+# Most tickers accepted in one batch analysis request
+MAX_BATCH_TICKERS = 25
 
 
 class QuarterlyMetrics(BaseModel):
@@ -52,6 +56,25 @@ class AnalysisRequest(BaseModel):
     include_current_price: bool = True
 
 
+class BatchAnalysisRequest(BaseModel):
+    """Request to analyze several stocks with batched LLM summaries."""
+    tickers: List[str] = Field(max_length=MAX_BATCH_TICKERS)
+    num_quarters: int = 3
+    include_current_price: bool = True
+    batch_size: Optional[int] = None  # Defaults to LLM_BATCH_SIZE
+
+
+class TickerSummary(BaseModel):
+    """Investment summary for one ticker in a batched LLM response."""
+    ticker: str
+    summary: str
+
+
+class BatchSummaries(BaseModel):
+    """Structured LLM output for a batch of tickers."""
+    summaries: List[TickerSummary]
+
+
 class AnalysisResponse(BaseModel):
     """Complete analysis response."""
     ticker: str
@@ -66,3 +89,37 @@ class AnalysisResponse(BaseModel):
     
     # Error info
     error: Optional[str] = None
+
+
+class TimeSeriesResponse(BaseModel):
+    """Columnar quarterly history for a set of concepts."""
+    ticker: str
+    company_name: Optional[str] = None
+    cik: Optional[str] = None
+    
+    concepts: List[str] = []
+    period_end: List[str] = []
+    fiscal_year: List[Optional[int]] = []
+    fiscal_period: List[Optional[str]] = []
+    series: Dict[str, List[Optional[float]]] = {}
+    derived: Dict[str, List[bool]] = {}  # True where Q4 = FY - (Q1 + Q2 + Q3)
+    
+    # Pagination over periods
+    total: int = 0
+    offset: int = 0
+    limit: int = 0
+
+
+class PointInTimeAnalysis(BaseModel):
+    """Metrics and trends as they were filed by a given date."""
+    as_of: str
+    quarterly_metrics: List[QuarterlyMetrics] = []
+    trend_analysis: Optional[TrendAnalysis] = None
+
+
+class HistoryResponse(BaseModel):
+    """Point-in-time analyses across many as-of dates (for backtesting)."""
+    ticker: str
+    company_name: Optional[str] = None
+    cik: Optional[str] = None
+    history: List[PointInTimeAnalysis] = []
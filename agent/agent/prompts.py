@@ -24,6 +24,25 @@ Provide a concise 2-3 sentence investment summary that:
 Keep the response under 150 words. Be specific and cite numbers."""
 
 
+# Batched variant: the instructions are sent once for several companies
+BATCH_SYNTHESIS_PROMPT = """You are a professional investment analyst. For each company below, provide a brief investment analysis.
+
+{companies}
+
+For EACH ticker, write a concise 2-3 sentence investment summary that:
+1. Summarizes the financial health based on the numbers
+2. Notes key strengths or concerns
+3. Gives a brief valuation perspective
+
+Keep each summary under 150 words. Be specific and cite numbers. Return one summary per ticker, using the ticker exactly as given."""
+
+BATCH_COMPANY_BLOCK = """=== {ticker} ({company_name}) ===
+QUARTERLY DATA (Most Recent 10-Q Filings):
+{metrics_summary}
+CURRENT PRICE: ${current_price}
+TRENDS: Revenue {revenue_trend} | Avg YoY Growth {avg_growth} | Margin {margin_trend} | EPS {eps_trend}"""
+
+
 def format_metrics_for_prompt(metrics_list) -> str:
     """Format quarterly metrics into a readable string for the LLM prompt."""
     if not metrics_list:
@@ -0,0 +1,120 @@
+"""
+HTTP response caching for analyses.
+
+An analysis is identified by an ETag derived from what it depends on: the
+filings behind its metrics (accession numbers), the current price rounded
+to a bucket, and the LLM model. The ETag can be computed without running the
+pipeline, so repeat views are answered with 304 or with the stored JSON body.
+"""
+import os
+import math
+import hashlib
+from datetime import date
+from collections import OrderedDict
+from typing import Optional, List
+
+from .tools.xbrl_extractor import (
+    get_ticker_to_cik,
+    peek_ticker_to_cik,
+    get_fact_index,
+    peek_fact_index,
+    REVENUE_CONCEPTS,
+)
+from .tools.metrics_snapshot import get_snapshot
+
+
+# Width of a price bucket, in percent; smaller moves keep the same ETag
+PRICE_BUCKET_PCT = float(os.getenv("PRICE_BUCKET_PCT", "1.0"))
+
+# Rendered analysis responses kept in memory, keyed by ETag
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "256"))
+
+
+def price_bucket(price: Optional[float]) -> str:
+    """Log-scale bucket for a price, so the bucket width is a fixed percentage."""
+    if not price or price <= 0:
+        return "none"
+    return str(math.floor(math.log(price) / math.log1p(PRICE_BUCKET_PCT / 100)))
+
+
+async def filing_versions(
+    ticker: str,
+    num_quarters: int,
+    warm_only: bool = False
+) -> Optional[List[str]]:
+    """
+    Identify the filings an analysis would be built from, without running it.
+    Uses the snapshot's creation time when the snapshot serves the request,
+    otherwise the accession numbers of the quarters' original filings plus
+    the company's latest filing (which catches restatements).
+
+    With warm_only=True nothing is downloaded: returns None unless the
+    snapshot or an already-cached fact index can answer.
+    """
+    snapshot = get_snapshot()
+    if snapshot and snapshot.covers(ticker, num_quarters):
+        return [f"snapshot:{snapshot.created}"]
+
+    if warm_only:
+        ticker_info = peek_ticker_to_cik(ticker)
+        index = peek_fact_index(ticker_info["cik_padded"]) if ticker_info else None
+        if index is None:
+            return None
+    else:
+        ticker_info = await get_ticker_to_cik(ticker)
+        if not ticker_info:
+            raise ValueError(f"Ticker '{ticker}' not found in SEC records")
+        index = await get_fact_index(ticker_info["cik_padded"])
+
+    periods = index.periods_as_of(REVENUE_CONCEPTS, form="10-Q", limit=num_quarters)
+    return [p["accn"] for p in periods] + [index.latest_accn]
+
+
+def compute_etag(
+    ticker: str,
+    num_quarters: int,
+    versions: List[str],
+    price: Optional[float],
+    model: str
+) -> str:
+    """
+    Strong ETag for an analysis built from the given inputs.
+    Includes today's date, since the response carries the analysis date.
+    """
+    parts = [
+        ticker.upper(), str(num_quarters), *versions,
+        price_bucket(price), model, date.today().isoformat(),
+    ]
+    digest = hashlib.sha1("|".join(parts).encode("utf-8")).hexdigest()
+    return f'"{digest}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """True if an If-None-Match header matches the ETag (weak comparison)."""
+    if not if_none_match:
+        return False
+    candidates = [c.strip() for c in if_none_match.split(",")]
+    return "*" in candidates or any(c.removeprefix("W/") == etag for c in candidates)
+
+
+class ResponseCache:
+    """Small LRU of rendered response bodies keyed by ETag."""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._bodies: "OrderedDict[str, bytes]" = OrderedDict()
+
+    def get(self, etag: str) -> Optional[bytes]:
+        body = self._bodies.get(etag)
+        if body is not None:
+            self._bodies.move_to_end(etag)
+        return body
+
+    def put(self, etag: str, body: bytes):
+        self._bodies[etag] = body
+        self._bodies.move_to_end(etag)
+        while len(self._bodies) > self.max_size:
+            self._bodies.popitem(last=False)
+
+
+response_cache = ResponseCache(RESPONSE_CACHE_SIZE)
@@ -0,0 +1,193 @@
+"""
+Concept Resolver - Learn which XBRL tag each company uses for each metric.
+No LLM tokens used here! This is pure Python parsing.
+
+Companies report the same metric under different us-gaap tags, and switch
+tags over time (e.g. SalesRevenueNet -> RevenueFromContractWithCustomer...).
+Instead of probing every candidate tag for every period, the resolver works
+out once per company which tag covers each metric over which date range.
+Extraction then does one direct lookup per metric.
+
+Resolutions are kept in memory, and persisted as JSON per CIK if
+CONCEPT_CACHE_DIR is set. They are invalidated when the company's latest
+filing (accession number) changes.
+"""
+import os
+import json
+from collections import OrderedDict
+from bisect import bisect_right
+from functools import partial
+from typing import Optional, Dict, List, Tuple, Callable
+
+from .fact_index import FactIndex
+
+
+# Directory for persisted resolutions (empty = memory only)
+CONCEPT_CACHE_DIR = os.getenv("CONCEPT_CACHE_DIR", "")
+
+# Forms whose facts count towards a tag's coverage
+COVERAGE_FORMS = ("10-Q", "10-K")
+
+# Most companies whose resolution is kept in memory (least recently used go
+# first); matches the fact index cache the resolutions are derived from
+RESOLUTION_CACHE_SIZE = int(os.getenv("FACT_INDEX_CACHE_SIZE", "32"))
+
+# Bumped when the resolution rules change, so persisted resolutions are redone
+RESOLUTION_VERSION = 2
+
+
+class ConceptResolution:
+    """Per-metric tag segments for one company: (concept, first_end, last_end)."""
+
+    def __init__(
+        self,
+        latest_accn: str,
+        segments: Dict[str, List[Tuple[str, str, str]]],
+        version: int = RESOLUTION_VERSION
+    ):
+        self.latest_accn = latest_accn
+        self.segments = segments
+        self.version = version
+        self._starts = {metric: [s[1] for s in segs] for metric, segs in segments.items()}
+        self._resolvers: Dict[str, Callable[[str], Optional[str]]] = {}
+
+    def concept_for(self, metric: str, period_end: str) -> Optional[str]:
+        """
+        The tag to use for a metric at a period end. Periods between or after
+        segments use the preceding segment's tag; earlier ones the first tag.
+        """
+        segs = self.segments.get(metric)
+        if not segs:
+            return None
+        i = max(0, bisect_right(self._starts[metric], period_end) - 1)
+        return segs[i][0]
+
+    def resolver(self, metric: str) -> Callable[[str], Optional[str]]:
+        """
+        concept_for bound to one metric, for FactIndex.quarterly_series.
+        Returns the same object on every call, so it can key memos.
+        """
+        if metric not in self._resolvers:
+            self._resolvers[metric] = partial(self.concept_for, metric)
+        return self._resolvers[metric]
+
+    def to_json(self) -> Dict:
+        return {
+            "version": self.version,
+            "latest_accn": self.latest_accn,
+            "segments": {metric: [list(s) for s in segs] for metric, segs in self.segments.items()},
+        }
+
+    @classmethod
+    def from_json(cls, data: Dict) -> "ConceptResolution":
+        return cls(
+            data.get("latest_accn", ""),
+            {metric: [tuple(s) for s in segs] for metric, segs in data.get("segments", {}).items()},
+            data.get("version", 1),
+        )
+
+
+def resolve_concepts(
+    index: FactIndex,
+    metric_concepts: Dict[str, Tuple[List[str], str]]
+) -> ConceptResolution:
+    """
+    Work out which tag covers each metric over time.
+
+    For every period end, the first candidate (in priority order) that
+    reports it wins; lower-priority tags only fill periods the preferred
+    ones don't cover. Consecutive periods resolved to the same tag are merged
+    into one segment, so a tag switch shows up as a new segment starting at
+    the first period of the new tag.
+    """
+    segments = {}
+    for metric, (candidates, unit) in metric_concepts.items():
+        coverage = {
+            concept: {
+                end for end, facts in index.facts_by_end(concept, unit).items()
+                if any(f.form in COVERAGE_FORMS for f in facts)
+            }
+            for concept in candidates
+        }
+        metric_segments: List[List[str]] = []
+        for end in sorted(set().union(*coverage.values())):
+            best = next(c for c in candidates if end in coverage[c])
+            if metric_segments and metric_segments[-1][0] == best:
+                metric_segments[-1][2] = end
+            else:
+                metric_segments.append([best, end, end])
+
+        segments[metric] = [tuple(s) for s in metric_segments]
+
+    return ConceptResolution(index.latest_accn, segments)
+
+
+_resolutions: "OrderedDict[str, ConceptResolution]" = OrderedDict()
+
+
+def _remember(cik: str, resolution: ConceptResolution):
+    """Keep a resolution in memory, dropping the least recently used ones."""
+    _resolutions[cik] = resolution
+    _resolutions.move_to_end(cik)
+    while len(_resolutions) > max(1, RESOLUTION_CACHE_SIZE):
+        _resolutions.popitem(last=False)
+
+
+def _cache_path(cik: str) -> str:
+    return os.path.join(CONCEPT_CACHE_DIR, f"{cik}.json")
+
+
+def _load_cached(cik: str) -> Optional[ConceptResolution]:
+    if not CONCEPT_CACHE_DIR:
+        return None
+    try:
+        with open(_cache_path(cik), "r", encoding="utf-8") as f:
+            return ConceptResolution.from_json(json.load(f))
+    except (OSError, ValueError):
+        return None
+
+
+def _save_cached(cik: str, resolution: ConceptResolution):
+    if not CONCEPT_CACHE_DIR:
+        return
+    try:
+        os.makedirs(CONCEPT_CACHE_DIR, exist_ok=True)
+        tmp_path = f"{_cache_path(cik)}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(resolution.to_json(), f)
+        os.replace(tmp_path, _cache_path(cik))
+    except OSError as e:
+        print(f"Could not persist concept resolution for CIK {cik}: {e}")
+
+
+def get_concept_resolution(
+    index: FactIndex,
+    metric_concepts: Dict[str, Tuple[List[str], str]]
+) -> ConceptResolution:
+    """
+    Get the tag resolution for a company, from memory, disk or by resolving.
+    A cached resolution is reused only while the company's latest filing is
+    unchanged, and only if it covers every requested metric and was made
+    with the current RESOLUTION_VERSION.
+    """
+    cik = index.cik
+
+    def is_current(cached: Optional[ConceptResolution]) -> bool:
+        return (
+            cached is not None
+            and cached.version == RESOLUTION_VERSION
+            and cached.latest_accn == index.latest_accn
+            and all(metric in cached.segments for metric in metric_concepts)
+        )
+
+    cached = _resolutions.get(cik)
+    if not is_current(cached):
+        cached = _load_cached(cik)
+    if is_current(cached):
+        _remember(cik, cached)
+        return cached
+
+    resolution = resolve_concepts(index, metric_concepts)
+    _remember(cik, resolution)
+    _save_cached(cik, resolution)
+    return resolution
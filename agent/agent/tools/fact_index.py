@@ -0,0 +1,292 @@
+"""
+Fact Index - Per-company index over SEC XBRL company facts.
+No LLM tokens used here! This is pure Python parsing.
+
+The companyfacts JSON is walked once and every us-gaap fact is stored by
+(concept, unit), sorted by period end and filed date. Lookups after that are
+direct dict accesses instead of re-scanning the raw JSON.
+"""
+from datetime import date, timedelta
+from typing import Optional, Dict, List, Any, Tuple, NamedTuple, Sequence, Callable
+
+
+# Duration windows (in days) used to tell discrete quarters from YTD/annual values
+QUARTER_DAYS = (80, 100)
+YEAR_DAYS = (350, 380)
+
+# Slack (in days) when matching Q1-Q3 to the fiscal year they belong to
+FISCAL_YEAR_SLACK_DAYS = 7
+
+
+class Fact(NamedTuple):
+    """A single reported XBRL value."""
+    end: str
+    start: Optional[str]
+    value: float
+    form: str
+    fiscal_year: Optional[int]
+    fiscal_period: Optional[str]
+    filed: str
+    accn: str
+
+
+class QuarterValue(NamedTuple):
+    """A discrete quarterly value (Q4 may be derived from the annual value)."""
+    end: str
+    start: Optional[str]
+    value: float
+    fiscal_year: Optional[int]
+    fiscal_period: Optional[str]
+    derived: bool = False
+
+
+def _days(start: str, end: str) -> int:
+    return (date.fromisoformat(end) - date.fromisoformat(start)).days
+
+
+def _duration(fact: Fact) -> int:
+    """Length of a fact's period in days (0 for instant values)."""
+    return _days(fact.start, fact.end) if fact.start else 0
+
+
+class FactIndex:
+    """Index of one company's us-gaap facts, keyed by (concept, unit)."""
+
+    def __init__(self, facts: Dict[str, Any]):
+        self.cik = str(facts.get("cik", ""))
+        self.entity_name = facts.get("entityName", "")
+        self.latest_filed = ""
+        self.latest_accn = ""
+        self._facts: Dict[Tuple[str, str], List[Fact]] = {}
+        self._quarterly: Dict[Tuple[Any, ...], Dict[str, QuarterValue]] = {}
+        self._by_end: Dict[Tuple[str, str], Dict[str, List[Fact]]] = {}
+        self._periods: Dict[Tuple[Tuple[str, ...], str], List[Fact]] = {}
+
+        us_gaap = facts.get("facts", {}).get("us-gaap", {})
+        for concept, concept_data in us_gaap.items():
+            for unit, values in concept_data.get("units", {}).items():
+                entries = []
+                for v in values:
+                    if v.get("end") is None or v.get("val") is None:
+                        continue
+                    fact = Fact(
+                        end=v["end"],
+                        start=v.get("start"),
+                        value=v["val"],
+                        form=v.get("form", ""),
+                        fiscal_year=v.get("fy"),
+                        fiscal_period=v.get("fp"),
+                        filed=v.get("filed", ""),
+                        accn=v.get("accn", ""),
+                    )
+                    entries.append(fact)
+                    if fact.filed > self.latest_filed:
+                        self.latest_filed, self.latest_accn = fact.filed, fact.accn
+                entries.sort(key=lambda f: (f.end, f.filed))
+                self._facts[(concept, unit)] = entries
+
+    def has(self, concept: str, unit: str = "USD") -> bool:
+        return (concept, unit) in self._facts
+
+    def units(self, concept: str) -> List[str]:
+        """Units reported for a concept (e.g. USD, USD/shares, shares)."""
+        return [u for (c, u) in self._facts if c == concept]
+
+    def get(self, concept: str, unit: str = "USD") -> List[Fact]:
+        """All facts for a concept/unit, sorted by (end, filed) ascending."""
+        return self._facts.get((concept, unit), [])
+
+    def facts_by_end(self, concept: str, unit: str = "USD") -> Dict[str, List[Fact]]:
+        """Facts for a concept/unit grouped by period end, each sorted by filed date."""
+        key = (concept, unit)
+        if key not in self._by_end:
+            grouped: Dict[str, List[Fact]] = {}
+            for f in self.get(concept, unit):
+                grouped.setdefault(f.end, []).append(f)
+            self._by_end[key] = grouped
+        return self._by_end[key]
+
+    def value_as_of(
+        self,
+        concepts: Sequence[str],
+        period_end: str,
+        unit: str = "USD",
+        form: str = "10-Q",
+        as_of: Optional[str] = None
+    ) -> Optional[float]:
+        """
+        Value for a period as it was known on as_of (YYYY-MM-DD).
+
+        Candidate tags are tried in priority order. Among a tag's facts for the
+        period, the latest filing on or before as_of wins, so later
+        restatements are ignored for earlier dates. Within one filing the
+        shortest duration (the discrete quarter rather than YTD) is used.
+        With as_of=None the latest restated value is returned.
+        """
+        for concept in concepts:
+            best = None
+            for f in self.facts_by_end(concept, unit).get(period_end, []):
+                if f.form != form or (as_of is not None and f.filed > as_of):
+                    continue
+                if best is None or f.filed > best.filed or (
+                    f.filed == best.filed and _duration(f) < _duration(best)
+                ):
+                    best = f
+            if best is not None:
+                return best.value
+        return None
+
+    def periods_as_of(
+        self,
+        concepts: Sequence[str],
+        form: str = "10-Q",
+        as_of: Optional[str] = None,
+        limit: Optional[int] = 12
+    ) -> List[Dict[str, Any]]:
+        """
+        The most recent reporting periods that had been filed by as_of
+        (all of them if limit is None).
+        Returns dicts with 'end', 'fiscal_year', 'fiscal_period' and 'accn',
+        taken from the original filing of each period, most recent first.
+        """
+        key = (tuple(concepts), form)
+        if key not in self._periods:
+            # Original (earliest) filing per period end, most recent period first
+            originals: Dict[str, Fact] = {}
+            for concept in concepts:
+                for end, facts in self.facts_by_end(concept).items():
+                    for f in facts:
+                        if f.form == form and (end not in originals or f.filed < originals[end].filed):
+                            originals[end] = f
+            self._periods[key] = sorted(originals.values(), key=lambda f: f.end, reverse=True)
+
+        periods = []
+        for f in self._periods[key]:
+            if as_of is not None and f.filed > as_of:
+                continue
+            periods.append({
+                "end": f.end,
+                "fiscal_year": f.fiscal_year,
+                "fiscal_period": f.fiscal_period,
+                "accn": f.accn,
+            })
+            if limit is not None and len(periods) >= limit:
+                break
+        return periods
+
+    def quarterly_series(
+        self,
+        concepts: Sequence[str],
+        unit: str = "USD",
+        resolve: Optional[Callable[[str], Optional[str]]] = None
+    ) -> Dict[str, QuarterValue]:
+        """
+        Discrete quarterly values for a metric, keyed by period end.
+
+        concepts are candidate tags in priority order; for each period the
+        first tag that reports it wins, so tag switches over time are merged
+        into one series. resolve optionally maps a period end to the tag the
+        concept resolver chose for it; that tag is tried first, so the series
+        matches build_quarterly_metrics. Values come from the latest filing
+        for that period (restatements win). Fiscal year/period labels come
+        from the original filing, since SEC tags comparatives with the fiscal
+        year of the filing that carries them. For flow concepts Q4 is derived
+        as FY minus Q1-Q3 when the filings do not report it directly.
+        Per-share units are not derived (share counts differ between
+        quarters), so their Q4 stays missing unless reported. Memoized per
+        (concepts, unit, resolve).
+        """
+        key = (tuple(concepts), unit, resolve)
+        if key not in self._quarterly:
+            self._quarterly[key] = self._build_quarterly(
+                {c: self.get(c, unit) for c in concepts},
+                derive_q4=not unit.endswith("/shares"),
+                resolve=resolve
+            )
+        return self._quarterly[key]
+
+    def _build_quarterly(
+        self,
+        candidates: Dict[str, List[Fact]],
+        derive_q4: bool = True,
+        resolve: Optional[Callable[[str], Optional[str]]] = None
+    ) -> Dict[str, QuarterValue]:
+        labels: Dict[str, Fact] = {}
+        quarterly_by_concept: Dict[str, Dict[str, Fact]] = {}
+        annual_by_concept: Dict[str, Dict[str, Fact]] = {}
+
+        for concept, facts in candidates.items():
+            picked_quarterly = quarterly_by_concept[concept] = {}
+            picked_annual = annual_by_concept[concept] = {}
+            for f in facts:
+                if not f.form.startswith("10-"):
+                    continue
+                if f.end not in labels or f.filed < labels[f.end].filed:
+                    labels[f.end] = f
+
+                # Facts are sorted by filed date, so later filings overwrite
+                if f.start is None:
+                    picked_quarterly[f.end] = f
+                    continue
+                days = _days(f.start, f.end)
+                if QUARTER_DAYS[0] <= days <= QUARTER_DAYS[1]:
+                    picked_quarterly[f.end] = f
+                elif YEAR_DAYS[0] <= days <= YEAR_DAYS[1]:
+                    picked_annual[f.end] = f
+
+        def merge(picks: Dict[str, Dict[str, Fact]]) -> Dict[str, Fact]:
+            # Resolved tag first, then the candidates in priority order
+            merged = {}
+            for end in set().union(*picks.values()):
+                preferred = resolve(end) if resolve else None
+                order = [preferred, *picks] if preferred in picks else list(picks)
+                merged[end] = next(picks[c][end] for c in order if end in picks[c])
+            return merged
+
+        quarterly = merge(quarterly_by_concept)
+        annual = merge(annual_by_concept)
+
+        series = {}
+        for end, latest in quarterly.items():
+            original = labels[end]
+            fp = "Q4" if original.fiscal_period == "FY" else original.fiscal_period
+            series[end] = QuarterValue(end, latest.start, latest.value, original.fiscal_year, fp)
+
+        if not derive_q4:
+            return dict(sorted(series.items()))
+
+        # Balance sheet (instant) values already cover the 10-K period end
+        for end in sorted(annual):
+            if end in series:
+                continue
+            q4 = self._derive_q4(series, annual[end], labels[end])
+            if q4:
+                series[end] = q4
+
+        return dict(sorted(series.items()))
+
+    @staticmethod
+    def _derive_q4(
+        quarters: Dict[str, QuarterValue],
+        annual: Fact,
+        original: Fact
+    ) -> Optional[QuarterValue]:
+        """Q4 = FY - (Q1 + Q2 + Q3), if exactly three quarters fall in the year."""
+        year_start = date.fromisoformat(annual.start) - timedelta(days=FISCAL_YEAR_SLACK_DAYS)
+        parts = [
+            q for q in quarters.values()
+            if q.start and date.fromisoformat(q.start) >= year_start and q.end < annual.end
+        ]
+        if len(parts) != 3:
+            return None
+
+        last_end = max(q.end for q in parts)
+        q4_start = (date.fromisoformat(last_end) + timedelta(days=1)).isoformat()
+        return QuarterValue(
+            end=annual.end,
+            start=q4_start,
+            value=annual.value - sum(q.value for q in parts),
+            fiscal_year=original.fiscal_year,
+            fiscal_period="Q4",
+            derived=True,
+        )
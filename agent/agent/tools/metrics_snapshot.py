@@ -0,0 +1,298 @@
+"""
+Metrics Snapshot - Precomputed quarterly metrics in a memory-mapped binary file.
+
+An export run writes the metrics for a list of tickers into a fixed-width
+snapshot. At startup the agent memory-maps that file, so a fresh process can
+serve warm results without hitting SEC. Lookups unpack only the records for
+the requested ticker straight from the mapped pages.
+
+File layout (little-endian):
+    header   magic "GTMS", version, record count, index offset, index length
+    records  one fixed-width record per quarter, grouped by ticker,
+             most recent quarter first
+    index    JSON object: ticker -> {cik, name, offset, count, latest_filed}
+
+A ticker is served from the snapshot only while the snapshot is younger than
+METRICS_SNAPSHOT_MAX_AGE_SECONDS and no newer filing has been seen for it
+(i.e. a cached fact index doesn't report a later filed date). Otherwise the
+agent falls back to SEC.
+
+Export with:
+    python -m agent.tools.metrics_snapshot --output metrics.snap AAPL MSFT
+"""
+import os
+import sys
+import json
+import math
+import mmap
+import struct
+import asyncio
+import argparse
+from datetime import datetime, timezone
+from typing import Optional, Dict, List, Any, Tuple
+
+from dotenv import load_dotenv
+
+# Run as the export command: load .env before the imports below read their
+# settings (SEC_USER_AGENT, METRICS_SNAPSHOT_PATH) at import time
+if __name__ == "__main__":
+    load_dotenv()
+
+from ..models import QuarterlyMetrics
+from .xbrl_extractor import extract_quarterly_metrics, get_ticker_to_cik, get_fact_index, peek_fact_index
+
+
+SNAPSHOT_MAGIC = b"GTMS"
+SNAPSHOT_VERSION = 1
+
+# Path of the snapshot to memory-map at startup (unset = disabled)
+METRICS_SNAPSHOT_PATH = os.getenv("METRICS_SNAPSHOT_PATH", "")
+
+# Snapshots older than this are ignored (0 = no age limit)
+METRICS_SNAPSHOT_MAX_AGE_SECONDS = int(os.getenv("METRICS_SNAPSHOT_MAX_AGE_SECONDS", "604800"))
+
+# Float columns of QuarterlyMetrics, in on-disk order. Missing values are NaN.
+FLOAT_FIELDS = (
+    "revenue",
+    "net_income",
+    "eps_basic",
+    "eps_diluted",
+    "gross_profit",
+    "operating_income",
+    "gross_margin",
+    "operating_margin",
+    "cash",
+    "total_debt",
+    "total_assets",
+    "stockholders_equity",
+    "operating_cash_flow",
+    "revenue_yoy_change",
+    "net_income_yoy_change",
+)
+
+_HEADER = struct.Struct("<4sHHIQQ")
+# period_end, form, fiscal_period, fiscal_year (0 = unknown), then the floats
+_RECORD = struct.Struct("<10s8s2si" + "d" * len(FLOAT_FIELDS))
+
+
+def _encode_str(value: Optional[str], width: int) -> bytes:
+    return (value or "").encode("ascii", "ignore")[:width]
+
+
+def _decode_str(raw: bytes) -> Optional[str]:
+    text = raw.rstrip(b"\0").decode("ascii")
+    return text or None
+
+
+def _pack_metrics(m: QuarterlyMetrics) -> bytes:
+    floats = []
+    for field in FLOAT_FIELDS:
+        value = getattr(m, field)
+        floats.append(float(value) if value is not None else math.nan)
+    return _RECORD.pack(
+        _encode_str(m.period_end, 10),
+        _encode_str(m.form, 8),
+        _encode_str(m.fiscal_period, 2),
+        m.fiscal_year or 0,
+        *floats,
+    )
+
+
+def _unpack_metrics(buffer, offset: int) -> QuarterlyMetrics:
+    period_end, form, fiscal_period, fiscal_year, *floats = _RECORD.unpack_from(buffer, offset)
+    values = {
+        field: (None if math.isnan(value) else value)
+        for field, value in zip(FLOAT_FIELDS, floats)
+    }
+    return QuarterlyMetrics(
+        period_end=_decode_str(period_end),
+        form=_decode_str(form) or "10-Q",
+        fiscal_period=_decode_str(fiscal_period),
+        fiscal_year=fiscal_year or None,
+        **values,
+    )
+
+
+def write_snapshot(
+    path: str,
+    entries: Dict[str, Tuple[str, str, List[QuarterlyMetrics]]],
+    latest_filed: Optional[Dict[str, str]] = None
+) -> int:
+    """
+    Write a snapshot file.
+    entries maps ticker -> (company_name, cik, metrics, most recent first).
+    latest_filed maps ticker -> date of the company's latest filing at export.
+    The file is written to a temp path and swapped in atomically, so running
+    processes keep reading their old mapping. Returns the number of records.
+    """
+    latest_filed = latest_filed or {}
+    index = {}
+    records = []
+    for ticker, (company_name, cik, metrics) in sorted(entries.items()):
+        index[ticker.upper()] = {
+            "cik": cik,
+            "name": company_name,
+            "offset": len(records),
+            "count": len(metrics),
+            "latest_filed": latest_filed.get(ticker),
+        }
+        records.extend(_pack_metrics(m) for m in metrics)
+
+    index_bytes = json.dumps({
+        "created": datetime.now(timezone.utc).isoformat(),
+        "tickers": index,
+    }).encode("utf-8")
+    index_offset = _HEADER.size + len(records) * _RECORD.size
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(_HEADER.pack(
+            SNAPSHOT_MAGIC, SNAPSHOT_VERSION, 0,
+            len(records), index_offset, len(index_bytes)
+        ))
+        for record in records:
+            f.write(record)
+        f.write(index_bytes)
+    os.replace(tmp_path, path)
+    return len(records)
+
+
+class MetricsSnapshot:
+    """Read-only, memory-mapped view of a snapshot file."""
+
+    def __init__(self, path: str, max_age_seconds: int = METRICS_SNAPSHOT_MAX_AGE_SECONDS):
+        self.path = path
+        self.max_age_seconds = max_age_seconds
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, _, record_count, index_offset, index_length = _HEADER.unpack_from(self._mm, 0)
+        if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+            self._mm.close()
+            raise ValueError(f"Unsupported metrics snapshot: {path}")
+
+        # Only the (small) index is parsed; records stay in the mapped pages
+        index = json.loads(self._mm[index_offset:index_offset + index_length])
+        self.created: Optional[str] = index.get("created")
+        self.record_count = record_count
+        self._tickers: Dict[str, Dict[str, Any]] = index.get("tickers", {})
+
+    def __contains__(self, ticker: str) -> bool:
+        return ticker.upper() in self._tickers
+
+    def __len__(self) -> int:
+        return len(self._tickers)
+
+    @property
+    def expired(self) -> bool:
+        """True once the snapshot is older than max_age_seconds."""
+        if not self.max_age_seconds or not self.created:
+            return False
+        age = datetime.now(timezone.utc) - datetime.fromisoformat(self.created)
+        return age.total_seconds() > self.max_age_seconds
+
+    def covers(self, ticker: str, num_quarters: int) -> bool:
+        """
+        True if lookup() would serve this request from the snapshot: the
+        ticker has enough quarters, the snapshot hasn't expired, and no newer
+        filing is known from an already-cached fact index.
+        """
+        entry = self._tickers.get(ticker.upper())
+        if not entry or entry["count"] < num_quarters or self.expired:
+            return False
+
+        index = peek_fact_index(entry["cik"].zfill(10))
+        exported_through = entry.get("latest_filed") or (self.created or "")[:10]
+        return not (index and index.latest_filed > exported_through)
+
+    def lookup(
+        self,
+        ticker: str,
+        num_quarters: int
+    ) -> Optional[Tuple[str, str, List[QuarterlyMetrics]]]:
+        """
+        Get (company_name, cik, metrics) for the N most recent quarters.
+        Returns None if the ticker is missing or has fewer than N quarters.
+        """
+        if not self.covers(ticker, num_quarters):
+            return None
+        entry = self._tickers[ticker.upper()]
+
+        base = _HEADER.size + entry["offset"] * _RECORD.size
+        metrics = [
+            _unpack_metrics(self._mm, base + i * _RECORD.size)
+            for i in range(num_quarters)
+        ]
+        return entry["name"], entry["cik"], metrics
+
+    def close(self):
+        self._mm.close()
+
+
+_snapshot: Optional[MetricsSnapshot] = None
+
+
+def load_snapshot(path: str = METRICS_SNAPSHOT_PATH) -> Optional[MetricsSnapshot]:
+    """
+    Memory-map the snapshot at path (called once at startup).
+    Returns None if no snapshot is configured or the file cannot be read.
+    """
+    global _snapshot
+    if not path:
+        return None
+    try:
+        _snapshot = MetricsSnapshot(path)
+        print(f"Loaded metrics snapshot {path} ({len(_snapshot)} tickers)")
+    except (OSError, ValueError) as e:
+        print(f"Metrics snapshot unavailable ({path}): {e}")
+        _snapshot = None
+    return _snapshot
+
+
+def get_snapshot() -> Optional[MetricsSnapshot]:
+    """Get the snapshot loaded at startup, if any."""
+    return _snapshot
+
+
+async def export_snapshot(
+    tickers: List[str],
+    path: str,
+    num_quarters: int = 12
+) -> int:
+    """
+    Extract metrics for each ticker from SEC and write them to a snapshot.
+    Tickers that fail are skipped. If every ticker fails, nothing is written,
+    so an existing snapshot is kept. Returns the number of tickers written.
+    """
+    entries = {}
+    latest_filed = {}
+    for ticker in tickers:
+        try:
+            entries[ticker.upper()] = await extract_quarterly_metrics(ticker, num_quarters)
+            # Already cached by the extraction above, so this doesn't refetch
+            ticker_info = await get_ticker_to_cik(ticker)
+            index = await get_fact_index(ticker_info["cik_padded"])
+            latest_filed[ticker.upper()] = index.latest_filed
+        except Exception as e:
+            print(f"Skipping {ticker}: {e}")
+
+    if not entries:
+        print(f"No tickers exported, keeping {path} unchanged")
+        return 0
+
+    write_snapshot(path, entries, latest_filed)
+    return len(entries)
+
+
+# Run with: python -m agent.tools.metrics_snapshot --output metrics.snap AAPL MSFT
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export a precomputed metrics snapshot")
+    parser.add_argument("tickers", nargs="+", help="Ticker symbols to export")
+    parser.add_argument("--output", default=METRICS_SNAPSHOT_PATH or "metrics.snap")
+    parser.add_argument("--quarters", type=int, default=12)
+    args = parser.parse_args()
+
+    count = asyncio.run(export_snapshot(args.tickers, args.output, args.quarters))
+    if not count:
+        sys.exit(1)
+    print(f"Wrote {count} tickers to {args.output}")
@@ -0,0 +1,98 @@
+"""
+Time Series - Columnar quarterly history served from the fact index.
+No LLM tokens used here! This is pure Python parsing.
+"""
+from typing import Optional, Dict, List, Any, Tuple
+
+from .fact_index import FactIndex
+from .xbrl_extractor import METRIC_CONCEPTS
+from .concept_resolver import get_concept_resolution
+
+
+DEFAULT_TIMESERIES_CONCEPTS = ["revenue", "net_income", "eps_diluted"]
+
+
+def resolve_concept(index: FactIndex, name: str) -> Optional[Tuple[List[str], str]]:
+    """
+    Map a requested concept to (candidate us-gaap tags, unit).
+    Accepts named metrics (e.g. "revenue") or raw us-gaap tags (e.g. "Assets").
+    Returns None if the company reports nothing under that name.
+    """
+    if name in METRIC_CONCEPTS:
+        return METRIC_CONCEPTS[name]
+
+    units = index.units(name)
+    if not units:
+        return None
+    unit = "USD" if "USD" in units else units[0]
+    return [name], unit
+
+
+def build_timeseries(
+    index: FactIndex,
+    concepts: List[str],
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    offset: int = 0,
+    limit: Optional[int] = None
+) -> Dict[str, Any]:
+    """
+    Build columnar quarterly arrays for the given concepts.
+
+    Periods are the union of quarter ends across all concepts, oldest first,
+    filtered to [start, end] and paginated with offset/limit. Each concept gets
+    a value array (None where not reported) and a mask of derived Q4 values.
+    Named metrics use the company's concept resolution, like the analysis.
+    Raises ValueError for concepts the company does not report.
+    """
+    series_by_concept = {}
+    unknown = []
+    resolution = None
+    for name in concepts:
+        resolved = resolve_concept(index, name)
+        if resolved is None:
+            unknown.append(name)
+            continue
+        resolve = None
+        if name in METRIC_CONCEPTS:
+            resolution = resolution or get_concept_resolution(index, METRIC_CONCEPTS)
+            resolve = resolution.resolver(name)
+        series_by_concept[name] = index.quarterly_series(*resolved, resolve=resolve)
+
+    if unknown:
+        raise ValueError(f"Unknown concepts: {', '.join(unknown)}")
+
+    periods = sorted({
+        period_end
+        for series in series_by_concept.values()
+        for period_end in series
+        if (not start or period_end >= start) and (not end or period_end <= end)
+    })
+    total = len(periods)
+    page = periods[offset:offset + limit] if limit is not None else periods[offset:]
+
+    fiscal_year = []
+    fiscal_period = []
+    for period_end in page:
+        label = next(s[period_end] for s in series_by_concept.values() if period_end in s)
+        fiscal_year.append(label.fiscal_year)
+        fiscal_period.append(label.fiscal_period)
+
+    series = {}
+    derived = {}
+    for name, values in series_by_concept.items():
+        points = [values.get(period_end) for period_end in page]
+        series[name] = [p.value if p else None for p in points]
+        derived[name] = [bool(p and p.derived) for p in points]
+
+    return {
+        "concepts": list(series_by_concept),
+        "period_end": page,
+        "fiscal_year": fiscal_year,
+        "fiscal_period": fiscal_period,
+        "series": series,
+        "derived": derived,
+        "total": total,
+        "offset": offset,
+        "limit": limit if limit is not None else total,
+    }
@@ -3,9 +3,14 @@ XBRL Extractor - Programmatic extraction of financial metrics from SEC XBRL data
 No LLM tokens used here! This is pure Python parsing.
 """
 import os
+import time
+import asyncio
 import httpx
-from typing import Optional, Dict, List, Any
+from collections import OrderedDict
+from typing import Optional, Dict, List, Any, Tuple
 from ..models import QuarterlyMetrics, TrendAnalysis
+from .fact_index import FactIndex
+from .concept_resolver import get_concept_resolution
 
 
 # SEC requires a User-Agent header with company name and email
@@ -20,6 +25,13 @@ SEC_USER_AGENT = os.getenv(
 SEC_COMPANY_TICKERS_URL = "https://www.sec.gov/files/company_tickers.json"
 SEC_COMPANY_FACTS_URL = "https://data.sec.gov/api/xbrl/companyfacts/CIK{cik}.json"
 
+# How long fetched SEC data is reused before it is downloaded again
+TICKER_MAP_TTL_SECONDS = int(os.getenv("TICKER_MAP_TTL_SECONDS", "86400"))
+FACT_INDEX_TTL_SECONDS = int(os.getenv("FACT_INDEX_TTL_SECONDS", "3600"))
+
+# Most companies whose fact index is kept in memory (least recently used go first)
+FACT_INDEX_CACHE_SIZE = int(os.getenv("FACT_INDEX_CACHE_SIZE", "32"))
+
 
 # Common XBRL concept mappings (US-GAAP taxonomy)
 # Many companies use different tags for the same concept, so we try multiple
@@ -73,11 +85,36 @@ OPERATING_CASH_FLOW_CONCEPTS = [
 ]
 
 
-async def get_ticker_to_cik(ticker: str) -> Optional[Dict[str, Any]]:
-    """
-    Get CIK and company info for a ticker symbol.
-    Returns dict with cik, cik_padded, and name.
-    """
+# Named metrics -> (candidate concepts in priority order, unit)
+METRIC_CONCEPTS = {
+    "revenue": (REVENUE_CONCEPTS, "USD"),
+    "net_income": (NET_INCOME_CONCEPTS, "USD"),
+    "eps_basic": (EPS_BASIC_CONCEPTS, "USD/shares"),
+    "eps_diluted": (EPS_DILUTED_CONCEPTS, "USD/shares"),
+    "gross_profit": (GROSS_PROFIT_CONCEPTS, "USD"),
+    "operating_income": (OPERATING_INCOME_CONCEPTS, "USD"),
+    "cash": (CASH_CONCEPTS, "USD"),
+    "total_assets": (ASSETS_CONCEPTS, "USD"),
+    "stockholders_equity": (EQUITY_CONCEPTS, "USD"),
+    "operating_cash_flow": (OPERATING_CASH_FLOW_CONCEPTS, "USD"),
+}
+
+
+# In-memory caches: ticker map, and fact index per CIK -> (fetched_at, value).
+# The fact index cache is an LRU bounded by FACT_INDEX_CACHE_SIZE.
+_ticker_map_cache: Optional[Tuple[float, Dict[str, Dict[str, Any]]]] = None
+_fact_index_cache: "OrderedDict[str, Tuple[float, FactIndex]]" = OrderedDict()
+
+# In-progress fact index loads, so concurrent misses share one download
+_fact_index_loads: Dict[str, "asyncio.Task[FactIndex]"] = {}
+
+
+async def _get_ticker_map() -> Dict[str, Dict[str, Any]]:
+    """Get the SEC ticker -> company info map, cached for TICKER_MAP_TTL_SECONDS."""
+    global _ticker_map_cache
+    if _ticker_map_cache and time.monotonic() - _ticker_map_cache[0] < TICKER_MAP_TTL_SECONDS:
+        return _ticker_map_cache[1]
+    
     async with httpx.AsyncClient() as client:
         response = await client.get(
             SEC_COMPANY_TICKERS_URL,
@@ -87,15 +124,34 @@ async def get_ticker_to_cik(ticker: str) -> Optional[Dict[str, Any]]:
         response.raise_for_status()
         data = response.json()
     
-    ticker_upper = ticker.upper()
+    ticker_map = {}
     for entry in data.values():
-        if entry.get("ticker", "").upper() == ticker_upper:
+        ticker_upper = entry.get("ticker", "").upper()
+        if ticker_upper and ticker_upper not in ticker_map:
             cik = entry["cik_str"]
-            return {
+            ticker_map[ticker_upper] = {
                 "cik": str(cik),
                 "cik_padded": str(cik).zfill(10),
                 "name": entry.get("title", "")
             }
+    
+    _ticker_map_cache = (time.monotonic(), ticker_map)
+    return ticker_map
+
+
+async def get_ticker_to_cik(ticker: str) -> Optional[Dict[str, Any]]:
+    """
+    Get CIK and company info for a ticker symbol.
+    Returns dict with cik, cik_padded, and name.
+    """
+    ticker_map = await _get_ticker_map()
+    return ticker_map.get(ticker.upper())
+
+
+def peek_ticker_to_cik(ticker: str) -> Optional[Dict[str, Any]]:
+    """Like get_ticker_to_cik, but only from the cached ticker map (never downloads)."""
+    if _ticker_map_cache and time.monotonic() - _ticker_map_cache[0] < TICKER_MAP_TTL_SECONDS:
+        return _ticker_map_cache[1].get(ticker.upper())
     return None
 
 
@@ -116,137 +172,99 @@ async def fetch_company_facts(cik_padded: str) -> Dict[str, Any]:
         return response.json()
 
 
-def extract_metric_values(
-    facts: Dict[str, Any],
-    concepts: List[str],
-    form_filter: str = "10-Q",
-    unit_filter: str = "USD"
-) -> List[Dict[str, Any]]:
-    """
-    Extract values for a metric from XBRL facts.
-    Tries multiple concept names and returns all matching values.
-    """
-    us_gaap = facts.get("facts", {}).get("us-gaap", {})
-    results = []
-    
-    for concept in concepts:
-        concept_data = us_gaap.get(concept, {})
-        units = concept_data.get("units", {})
-        
-        # Get values for the specified unit (USD or USD/shares for EPS)
-        values = units.get(unit_filter, [])
-        
-        for v in values:
-            if v.get("form") == form_filter:
-                results.append({
-                    "concept": concept,
-                    "value": v.get("val"),
-                    "end": v.get("end"),
-                    "fiscal_year": v.get("fy"),
-                    "fiscal_period": v.get("fp"),
-                    "filed": v.get("filed"),
-                    "accn": v.get("accn"),
-                })
-    
-    # Sort by end date descending (most recent first)
-    results.sort(key=lambda x: x.get("end", ""), reverse=True)
-    return results
-
-
-def get_most_recent_value(
-    facts: Dict[str, Any],
-    concepts: List[str],
-    period_end: str,
-    form_filter: str = "10-Q",
-    unit_filter: str = "USD"
-) -> Optional[float]:
-    """
-    Get the most recent value for a metric that matches the given period end date.
-    """
-    values = extract_metric_values(facts, concepts, form_filter, unit_filter)
-    
-    for v in values:
-        if v.get("end") == period_end:
-            return v.get("value")
+def peek_fact_index(cik_padded: str) -> Optional[FactIndex]:
+    """Get a company's fact index only if it is already cached (never downloads)."""
+    cached = _fact_index_cache.get(cik_padded)
+    if cached is None:
+        return None
+    if time.monotonic() - cached[0] >= FACT_INDEX_TTL_SECONDS:
+        del _fact_index_cache[cik_padded]
+        return None
+    _fact_index_cache.move_to_end(cik_padded)
+    return cached[1]
+
+
+def _store_fact_index(cik_padded: str, index: FactIndex):
+    """Cache an index, dropping expired entries and then least recently used ones."""
+    now = time.monotonic()
+    for cik, (fetched_at, _) in list(_fact_index_cache.items()):
+        if now - fetched_at >= FACT_INDEX_TTL_SECONDS:
+            del _fact_index_cache[cik]
     
-    return None
+    _fact_index_cache[cik_padded] = (now, index)
+    _fact_index_cache.move_to_end(cik_padded)
+    while len(_fact_index_cache) > max(1, FACT_INDEX_CACHE_SIZE):
+        _fact_index_cache.popitem(last=False)
+
 
+async def _load_fact_index(cik_padded: str) -> FactIndex:
+    try:
+        index = FactIndex(await fetch_company_facts(cik_padded))
+        _store_fact_index(cik_padded, index)
+        return index
+    finally:
+        _fact_index_loads.pop(cik_padded, None)
 
-def get_unique_periods(
-    facts: Dict[str, Any],
-    form_filter: str = "10-Q",
-    limit: int = 12
-) -> List[Dict[str, str]]:
+
+async def get_fact_index(cik_padded: str) -> FactIndex:
     """
-    Get a list of unique reporting periods from the XBRL data.
-    Returns list of dicts with 'end', 'fiscal_year', 'fiscal_period'.
+    Get the fact index for a company, cached for FACT_INDEX_TTL_SECONDS.
+    The raw company facts are only downloaded and indexed on a cache miss,
+    and concurrent misses for the same company wait on a single download.
     """
-    us_gaap = facts.get("facts", {}).get("us-gaap", {})
-    periods = set()
-    
-    # Look through revenue concepts to find periods
-    for concept in REVENUE_CONCEPTS:
-        concept_data = us_gaap.get(concept, {})
-        units = concept_data.get("units", {})
-        values = units.get("USD", [])
-        
-        for v in values:
-            if v.get("form") == form_filter:
-                period_key = (v.get("end"), v.get("fy"), v.get("fp"))
-                if period_key[0]:  # Only add if we have an end date
-                    periods.add(period_key)
+    cached = peek_fact_index(cik_padded)
+    if cached:
+        return cached
     
-    # Sort by end date descending
-    sorted_periods = sorted(periods, key=lambda x: x[0], reverse=True)
+    load = _fact_index_loads.get(cik_padded)
+    if load is None:
+        load = asyncio.ensure_future(_load_fact_index(cik_padded))
+        _fact_index_loads[cik_padded] = load
     
-    return [
-        {"end": p[0], "fiscal_year": p[1], "fiscal_period": p[2]}
-        for p in sorted_periods[:limit]
-    ]
+    # Shielded so one cancelled request doesn't cancel the shared load
+    return await asyncio.shield(load)
 
 
-async def extract_quarterly_metrics(
-    ticker: str,
-    num_quarters: int = 3
-) -> tuple[str, str, List[QuarterlyMetrics]]:
+def build_quarterly_metrics(
+    index: FactIndex,
+    num_quarters: int = 3,
+    as_of: Optional[str] = None
+) -> List[QuarterlyMetrics]:
     """
-    Extract financial metrics for the N most recent quarters.
-    Returns (company_name, cik, list of QuarterlyMetrics).
+    Build metrics for the N most recent quarters from a fact index.
+    With as_of (YYYY-MM-DD), only filings made on or before that date are
+    used: both which quarters exist and the values reported for them.
     """
-    # Get CIK for ticker
-    ticker_info = await get_ticker_to_cik(ticker)
-    if not ticker_info:
-        raise ValueError(f"Ticker '{ticker}' not found in SEC records")
-    
-    company_name = ticker_info["name"]
-    cik = ticker_info["cik"]
-    cik_padded = ticker_info["cik_padded"]
-    
-    # Fetch XBRL data
-    facts = await fetch_company_facts(cik_padded)
-    
-    # Get unique 10-Q periods
-    periods = get_unique_periods(facts, form_filter="10-Q", limit=num_quarters)
-    
-    if not periods:
-        raise ValueError(f"No 10-Q filings found for {ticker}")
+    periods = index.periods_as_of(REVENUE_CONCEPTS, form="10-Q", as_of=as_of, limit=num_quarters)
+    resolution = get_concept_resolution(index, METRIC_CONCEPTS)
     
     metrics_list = []
     
-    for period in periods[:num_quarters]:
+    for period in periods:
         period_end = period["end"]
         
+        def value(metric: str) -> Optional[float]:
+            concepts, unit = METRIC_CONCEPTS[metric]
+            # One direct lookup on the company's resolved tag; the candidate
+            # list is only probed if that tag had no value as of this date
+            concept = resolution.concept_for(metric, period_end)
+            if concept:
+                v = index.value_as_of([concept], period_end, unit=unit, as_of=as_of)
+                if v is not None:
+                    return v
+            return index.value_as_of(concepts, period_end, unit=unit, as_of=as_of)
+        
         # Extract each metric for this period
-        revenue = get_most_recent_value(facts, REVENUE_CONCEPTS, period_end)
-        net_income = get_most_recent_value(facts, NET_INCOME_CONCEPTS, period_end)
-        eps_basic = get_most_recent_value(facts, EPS_BASIC_CONCEPTS, period_end, unit_filter="USD/shares")
-        eps_diluted = get_most_recent_value(facts, EPS_DILUTED_CONCEPTS, period_end, unit_filter="USD/shares")
-        gross_profit = get_most_recent_value(facts, GROSS_PROFIT_CONCEPTS, period_end)
-        operating_income = get_most_recent_value(facts, OPERATING_INCOME_CONCEPTS, period_end)
-        cash = get_most_recent_value(facts, CASH_CONCEPTS, period_end)
-        total_assets = get_most_recent_value(facts, ASSETS_CONCEPTS, period_end)
-        equity = get_most_recent_value(facts, EQUITY_CONCEPTS, period_end)
-        ocf = get_most_recent_value(facts, OPERATING_CASH_FLOW_CONCEPTS, period_end)
+        revenue = value("revenue")
+        net_income = value("net_income")
+        eps_basic = value("eps_basic")
+        eps_diluted = value("eps_diluted")
+        gross_profit = value("gross_profit")
+        operating_income = value("operating_income")
+        cash = value("cash")
+        total_assets = value("total_assets")
+        equity = value("stockholders_equity")
+        ocf = value("operating_cash_flow")
         
         # Calculate margins if we have the data
         gross_margin = None
@@ -276,7 +294,70 @@ async def extract_quarterly_metrics(
         )
         metrics_list.append(metrics)
     
-    return company_name, cik, metrics_list
+    return metrics_list
+
+
+async def extract_quarterly_metrics(
+    ticker: str,
+    num_quarters: int = 3,
+    as_of: Optional[str] = None
+) -> tuple[str, str, List[QuarterlyMetrics]]:
+    """
+    Extract financial metrics for the N most recent quarters.
+    With as_of, returns the numbers as they were filed by that date.
+    Returns (company_name, cik, list of QuarterlyMetrics).
+    """
+    # Get CIK for ticker
+    ticker_info = await get_ticker_to_cik(ticker)
+    if not ticker_info:
+        raise ValueError(f"Ticker '{ticker}' not found in SEC records")
+    
+    # Fetch (or reuse) the indexed XBRL data
+    index = await get_fact_index(ticker_info["cik_padded"])
+    
+    metrics_list = build_quarterly_metrics(index, num_quarters, as_of)
+    
+    if not metrics_list:
+        raise ValueError(f"No 10-Q filings found for {ticker}")
+    
+    return ticker_info["name"], ticker_info["cik"], metrics_list
+
+
+async def extract_historical_metrics(
+    ticker: str,
+    as_of_dates: Optional[List[str]] = None,
+    num_quarters: int = 3,
+    start: Optional[str] = None,
+    end: Optional[str] = None
+) -> tuple[str, str, List[tuple[str, List[QuarterlyMetrics], TrendAnalysis]]]:
+    """
+    Point-in-time metrics and trends for many as-of dates in one pass.
+    The company facts are fetched and indexed once; each date is then a set
+    of direct index lookups. Defaults to every 10-Q period end on record.
+    Only dates within [start, end] (YYYY-MM-DD, inclusive) are computed.
+    Returns (company_name, cik, list of (as_of, metrics, trends)), oldest first.
+    """
+    ticker_info = await get_ticker_to_cik(ticker)
+    if not ticker_info:
+        raise ValueError(f"Ticker '{ticker}' not found in SEC records")
+    
+    index = await get_fact_index(ticker_info["cik_padded"])
+    
+    if as_of_dates is None:
+        all_periods = index.periods_as_of(REVENUE_CONCEPTS, form="10-Q", limit=None)
+        as_of_dates = [p["end"] for p in all_periods]
+    
+    as_of_dates = [
+        d for d in as_of_dates
+        if (not start or d >= start) and (not end or d <= end)
+    ]
+    
+    history = []
+    for as_of in sorted(as_of_dates):
+        metrics = build_quarterly_metrics(index, num_quarters, as_of)
+        history.append((as_of, metrics, calculate_trends(metrics)))
+    
+    return ticker_info["name"], ticker_info["cik"], history
 
 
 def calculate_trends(metrics: List[QuarterlyMetrics]) -> TrendAnalysis:
@@ -5,23 +5,48 @@ This server provides REST API endpoints for the AI investment analysis agent.
 Run with: uvicorn main:app --reload --port 8000
 """
 import os
+from datetime import date
+from contextlib import asynccontextmanager
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
 load_dotenv()
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
 
-from agent.models import AnalysisRequest, AnalysisResponse
-from agent.graph import analyze_stock
+from typing import List, Optional
+
+from agent.models import (
+    AnalysisRequest,
+    AnalysisResponse,
+    BatchAnalysisRequest,
+    TimeSeriesResponse,
+    PointInTimeAnalysis,
+    HistoryResponse,
+)
+from agent.graph import analyze_stock, analyze_stocks, has_fresh_summary
+from agent.admission import analysis_admission, llm_admission, AdmissionRejected
+from agent.response_cache import response_cache, filing_versions, compute_etag, etag_matches
+from agent.tools.price_fetcher import get_current_price
+from agent.tools.metrics_snapshot import load_snapshot
+from agent.tools.xbrl_extractor import get_ticker_to_cik, get_fact_index, extract_historical_metrics
+from agent.tools.timeseries import build_timeseries, DEFAULT_TIMESERIES_CONCEPTS
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Memory-map the precomputed metrics snapshot, if configured."""
+    load_snapshot()
+    yield
 
 
 # Create FastAPI app
 app = FastAPI(
     title="Giraffe Terminal AI Agent",
     description="AI-powered investment analysis using SEC 10-Q filings",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Add CORS middleware for React frontend
@@ -50,6 +75,34 @@ async def health():
     return {"status": "healthy"}
 
 
+@app.get("/stats")
+async def stats():
+    """Admission control stats: in-flight work, queue depth and shed counts."""
+    return {
+        "analysis": analysis_admission.stats(),
+        "llm": llm_admission.stats(),
+    }
+
+
+def _busy(e: AdmissionRejected) -> HTTPException:
+    """Fast 503 for shed requests, telling the client when to retry."""
+    return HTTPException(
+        status_code=503,
+        detail="Server is busy, please retry later",
+        headers={"Retry-After": str(e.retry_after)},
+    )
+
+
+def _parse_date(value: Optional[str], name: str) -> Optional[str]:
+    """Validate a YYYY-MM-DD query parameter, returning it normalized (400 if invalid)."""
+    if value is None or not value.strip():
+        return None
+    try:
+        return date.fromisoformat(value.strip()).isoformat()
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid {name} date '{value}', expected YYYY-MM-DD")
+
+
 @app.post("/analyze/{ticker}", response_model=AnalysisResponse)
 async def analyze(ticker: str, request: AnalysisRequest = None):
     """
@@ -73,23 +126,266 @@ async def analyze(ticker: str, request: AnalysisRequest = None):
         request = AnalysisRequest()
     
     try:
-        result = await analyze_stock(
-            ticker=ticker,
-            num_quarters=request.num_quarters,
-            include_current_price=request.include_current_price
-        )
+        async with analysis_admission.slot():
+            result = await analyze_stock(
+                ticker=ticker,
+                num_quarters=request.num_quarters,
+                include_current_price=request.include_current_price
+            )
         
         if result.error:
             raise HTTPException(status_code=400, detail=result.error)
         
         return result
     
+    except HTTPException:
+        raise
+    except AdmissionRejected as e:
+        raise _busy(e)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Analysis failed: {str(e)}")
+
+
+async def _cached_analysis(
+    request: Request,
+    ticker: str,
+    num_quarters: int,
+    versions: List[str],
+    include_current_price: bool
+):
+    """
+    Compute the ETag for an analysis and answer from it if possible.
+    Returns (price, headers, response); response is None on a cache miss.
+    """
+    price = await get_current_price(ticker) if include_current_price else None
+    etag = compute_etag(ticker, num_quarters, versions, price, os.getenv("LLM_MODEL", "gemini-2.0-flash"))
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return price, headers, Response(status_code=304, headers=headers)
+    
+    body = response_cache.get(etag)
+    if body is not None:
+        return price, headers, Response(content=body, media_type="application/json", headers=headers)
+    
+    return price, headers, None
+
+
+@app.get("/analyze/{ticker}", response_model=AnalysisResponse)
+async def analyze_cached(
+    ticker: str,
+    request: Request,
+    num_quarters: int = Query(3, ge=1, le=40),
+    include_current_price: bool = True
+):
+    """
+    Cacheable variant of POST /analyze/{ticker}.
+    
+    The ETag is computed before running the pipeline, from the filings behind
+    the metrics, the current price bucket and the LLM model. A matching
+    If-None-Match gets 304; otherwise a stored body for the same ETag is
+    returned as-is. Only a miss runs the analysis (and the LLM).
+    
+    Revalidation skips admission control only when the snapshot or an
+    already-cached fact index can answer it. Otherwise it needs an SEC
+    download, so it runs inside an analysis slot like the analysis itself.
+    
+    Args:
+        ticker: Stock ticker symbol (e.g., "AAPL", "MSFT")
+        num_quarters: Number of 10-Q quarters to analyze
+        include_current_price: Whether to fetch current price from Giraffe API
+    
+    Returns:
+        AnalysisResponse (JSON), or 304 Not Modified
+    """
+    ticker = ticker.upper()
+    
+    try:
+        versions = await filing_versions(ticker, num_quarters, warm_only=True)
+        if versions is not None:
+            price, headers, cached = await _cached_analysis(
+                request, ticker, num_quarters, versions, include_current_price
+            )
+            if cached is not None:
+                return cached
+        
+        async with analysis_admission.slot():
+            if versions is None:
+                versions = await filing_versions(ticker, num_quarters)
+                price, headers, cached = await _cached_analysis(
+                    request, ticker, num_quarters, versions, include_current_price
+                )
+                if cached is not None:
+                    return cached
+            
+            # The price behind the ETag is final, even if none was found
+            result = await analyze_stock(
+                ticker=ticker,
+                num_quarters=num_quarters,
+                include_current_price=False,
+                current_price=price
+            )
+        
+        if result.error:
+            raise HTTPException(status_code=400, detail=result.error)
+        
+        # Serialize once in pydantic-core, skipping the jsonable_encoder pass
+        body = result.model_dump_json().encode("utf-8")
+        
+        # Don't let clients or the cache keep a placeholder summary
+        if not has_fresh_summary(result):
+            return Response(content=body, media_type="application/json")
+        
+        response_cache.put(headers["ETag"], body)
+        return Response(content=body, media_type="application/json", headers=headers)
+    
+    except HTTPException:
+        raise
+    except AdmissionRejected as e:
+        raise _busy(e)
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Analysis failed: {str(e)}")
 
 
+@app.post("/analyze", response_model=List[AnalysisResponse])
+async def analyze_batch(request: BatchAnalysisRequest):
+    """
+    Analyze several stocks, batching the LLM summaries.
+    
+    The data steps run concurrently per ticker; summaries are generated for
+    several tickers per LLM call (see LLM_BATCH_SIZE). Each ticker takes its
+    own analysis slot. Per-ticker failures (including shed tickers) are
+    reported in each response's `error` field rather than failing the batch;
+    only a batch whose tickers are all shed gets 503.
+    
+    Args:
+        request: Tickers and analysis configuration
+    
+    Returns:
+        One AnalysisResponse per ticker, in request order
+    """
+    if not request.tickers:
+        raise HTTPException(status_code=400, detail="No tickers provided")
+    
+    try:
+        return await analyze_stocks(
+            tickers=request.tickers,
+            num_quarters=request.num_quarters,
+            include_current_price=request.include_current_price,
+            batch_size=request.batch_size
+        )
+    except AdmissionRejected as e:
+        raise _busy(e)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Analysis failed: {str(e)}")
+
+
+@app.get("/timeseries/{ticker}", response_model=TimeSeriesResponse)
+async def timeseries(
+    ticker: str,
+    concepts: Optional[str] = None,
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    offset: int = Query(0, ge=0),
+    limit: int = Query(40, ge=1, le=400)
+):
+    """
+    Quarterly history for a stock as columnar arrays. No LLM used.
+    
+    Served from the cached per-company fact index, so any depth of history
+    costs the same as the latest quarter. Q4 is derived as FY - (Q1 + Q2 + Q3)
+    when it only appears in the 10-K (except per-share values, left null).
+    
+    Args:
+        ticker: Stock ticker symbol (e.g., "AAPL")
+        concepts: Comma-separated metric names (e.g. "revenue,eps_diluted")
+            or us-gaap tags (e.g. "Assets")
+        start: Earliest period end (YYYY-MM-DD), inclusive
+        end: Latest period end (YYYY-MM-DD), inclusive
+        offset: Number of periods to skip (oldest first)
+        limit: Maximum number of periods to return
+    
+    Returns:
+        TimeSeriesResponse with one array per concept, aligned to period_end
+    """
+    names = [c.strip() for c in concepts.split(",") if c.strip()] if concepts else DEFAULT_TIMESERIES_CONCEPTS
+    start = _parse_date(start, "start")
+    end = _parse_date(end, "end")
+    
+    try:
+        ticker_info = await get_ticker_to_cik(ticker)
+        if not ticker_info:
+            raise HTTPException(status_code=404, detail=f"Ticker '{ticker}' not found in SEC records")
+        
+        index = await get_fact_index(ticker_info["cik_padded"])
+        data = build_timeseries(index, names, start, end, offset, limit)
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Time series failed: {str(e)}")
+    
+    return TimeSeriesResponse(
+        ticker=ticker.upper(),
+        company_name=ticker_info["name"],
+        cik=ticker_info["cik"],
+        **data
+    )
+
+
+@app.get("/history/{ticker}", response_model=HistoryResponse)
+async def history(
+    ticker: str,
+    as_of: Optional[str] = None,
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    num_quarters: int = Query(3, ge=1, le=40)
+):
+    """
+    Point-in-time (as-filed) metrics and trends for backtesting. No LLM used.
+    
+    Each entry shows what the numbers looked like on its as-of date: only
+    filings made on or before that date are used, so later restatements
+    don't leak into earlier results.
+    
+    Args:
+        ticker: Stock ticker symbol (e.g., "AAPL")
+        as_of: Comma-separated dates (YYYY-MM-DD). Defaults to every 10-Q
+            period end on record
+        start: Earliest as-of date, inclusive
+        end: Latest as-of date, inclusive
+        num_quarters: Number of 10-Q quarters per as-of date
+    
+    Returns:
+        HistoryResponse with one PointInTimeAnalysis per as-of date, oldest first
+    """
+    dates = [_parse_date(d, "as_of") for d in as_of.split(",") if d.strip()] if as_of else None
+    start = _parse_date(start, "start")
+    end = _parse_date(end, "end")
+    
+    try:
+        company_name, cik, results = await extract_historical_metrics(ticker, dates, num_quarters, start, end)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"History failed: {str(e)}")
+    
+    return HistoryResponse(
+        ticker=ticker.upper(),
+        company_name=company_name,
+        cik=cik,
+        history=[
+            PointInTimeAnalysis(as_of=d, quarterly_metrics=metrics, trend_analysis=trends)
+            for d, metrics, trends in results
+        ]
+    )
+
+
 # Run with: python main.py
 if __name__ == "__main__":
     import uvicorn
@@ -171,15 +171,13 @@ export const deleteTheme = (id) => request(`/themes/${id}`, { method: 'DELETE' }
 // AI Investment Analysis Agent (Python backend)
 const AI_AGENT_URL = 'http://localhost:8000';
 
+// GET so the browser cache revalidates with If-None-Match (304 on repeat views)
 export const analyzeStock = async (ticker, options = {}) => {
-  const response = await fetch(`${AI_AGENT_URL}/analyze/${ticker}`, {
-    method: 'POST',
-    headers: { 'Content-Type': 'application/json' },
-    body: JSON.stringify({
-      num_quarters: options.numQuarters || 3,
-      include_current_price: true
-    })
+  const params = new URLSearchParams({
+    num_quarters: options.numQuarters || 3,
+    include_current_price: true
   });
+  const response = await fetch(`${AI_AGENT_URL}/analyze/${ticker}?${params}`);
   if (!response.ok) {
     const error = await response.json().catch(() => ({ detail: 'Analysis failed' }));
     throw new Error(error.detail || 'Analysis failed');